@@ -1,14 +1,40 @@
+import hashlib
 import streamlit as st
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from fpdf import FPDF
-import os
+from io import BytesIO
 from utils import (
-    read_fasta, gc_content, codon_frequency, motif_search, compare_sequences,
+    read_fasta, analyze, gc_content, codon_frequency, motif_search, compare_sequences,
     find_ambiguous_bases, sliding_gc, gc_outliers, premature_stop_flags, simple_snp_diff
 )
 
+# Streamlit reruns the whole script on every widget change. analyze() runs once
+# per "Run analysis" and its SeqStats live in session state (see below); the
+# motif search depends on a widget, so it is cached on (sequence, motif).
+# Streamlit only hashes a sample of large arrays, so key sequences on a full
+# digest; otherwise same-length sequences differing in a few bases collide.
+cache = st.cache_data(
+    show_spinner=False,
+    hash_funcs={np.ndarray: lambda a: hashlib.sha1(np.ascontiguousarray(a)).digest()}
+)
+motif_search = cache(motif_search)
+
+@cache
+def load_fasta(data):
+    return read_fasta(BytesIO(data))
+
+MAX_PLOT_POSITIONS = 50000
+
+def plot_positions(positions, limit=MAX_PLOT_POSITIONS):
+    # evenly thin dense hits for plotting; reported counts use the full list
+    positions = np.asarray(positions)
+    if positions.size > limit:
+        positions = positions[np.linspace(0, positions.size-1, limit, dtype=int)]
+    return positions
+
 st.set_page_config(page_title="DNA Analysis & Comparison Tool", layout="wide")
 st.markdown("<h1 style='text-align:center; color:#2E86C1;'>🧬 DNA Analysis & Comparison Tool</h1>", unsafe_allow_html=True)
 st.markdown("---")
@@ -28,14 +54,35 @@ else:
 
 download_report = st.checkbox("📄 Generate Detailed PDF Report")
 
+# Heavy analytics only run after "Run analysis"; results are kept in session
+# state so later widget changes reuse them until different files are uploaded.
+analysis = None
 if file1 and file2:
-    id1, seq1 = read_fasta(file1)
-    id2, seq2 = read_fasta(file2)
-
-    gc1, gc2 = gc_content(seq1), gc_content(seq2)
-    codon1, codon2 = codon_frequency(seq1), codon_frequency(seq2)
+    upload_key = (file1.file_id, file2.file_id)
+    analysis = st.session_state.get("analysis")
+    if analysis is None or analysis["key"] != upload_key:
+        analysis = None
+        if st.button("▶️ Run analysis"):
+            id1, seq1 = load_fasta(file1.getvalue())
+            id2, seq2 = load_fasta(file2.getvalue())
+            stats1, stats2 = analyze(seq1), analyze(seq2)
+            analysis = {
+                "key": upload_key,
+                "id1": id1, "seq1": seq1, "stats1": stats1,
+                "id2": id2, "seq2": seq2, "stats2": stats2,
+                "gc1": gc_content(stats1), "gc2": gc_content(stats2),
+                "codon1": codon_frequency(stats1), "codon2": codon_frequency(stats2),
+                "similarity": compare_sequences(seq1, seq2)  # first 2000 bases
+            }
+            st.session_state["analysis"] = analysis
+
+if analysis is not None:
+    id1, seq1, stats1 = analysis["id1"], analysis["seq1"], analysis["stats1"]
+    id2, seq2, stats2 = analysis["id2"], analysis["seq2"], analysis["stats2"]
+    gc1, gc2 = analysis["gc1"], analysis["gc2"]
+    codon1, codon2 = analysis["codon1"], analysis["codon2"]
+    similarity = analysis["similarity"]
     motif_pos1, motif_pos2 = motif_search(seq1, motif_input), motif_search(seq2, motif_input)
-    similarity = compare_sequences(seq1[:2000], seq2[:2000])  # fast subset
 
     st.markdown("## 📊 Sequence Analysis")
     col1, col2 = st.columns(2)
@@ -54,9 +101,9 @@ if file1 and file2:
     st.pyplot(fig1)
 
     fig2, ax2 = plt.subplots(2, 1, figsize=(10, 5))
-    ax2[0].stem(motif_pos1, [1]*len(motif_pos1), linefmt="C0-", markerfmt="C0o")
+    ax2[0].vlines(plot_positions(motif_pos1), 0, 1, colors="C0")
     ax2[0].set_title(f"Motif Positions - {id1}")
-    ax2[1].stem(motif_pos2, [1]*len(motif_pos2), linefmt="C1-", markerfmt="C1o")
+    ax2[1].vlines(plot_positions(motif_pos2), 0, 1, colors="C1")
     ax2[1].set_title(f"Motif Positions - {id2}")
     st.pyplot(fig2)
 
@@ -81,8 +128,8 @@ if file1 and file2:
     ref_file = st.file_uploader("Optional: Upload Reference FASTA for quick SNP check", type=["fasta","fa"])
 
     if run_defect:
-        amb1 = find_ambiguous_bases(seq1)
-        amb2 = find_ambiguous_bases(seq2)
+        amb1 = find_ambiguous_bases(stats1)
+        amb2 = find_ambiguous_bases(stats2)
 
         st.write("**Unknown/IUPAC bases**")
         colA, colB = st.columns(2)
@@ -94,34 +141,46 @@ if file1 and file2:
             st.write(f"IUPAC counts: {amb2['iupac_counts']}")
 
         st.write("**GC window outliers (z≥2.5)**")
-        gcw1 = sliding_gc(seq1, win=1000)
-        gcw2 = sliding_gc(seq2, win=1000)
+        gc_step = st.slider("GC window step (bases)", min_value=100, max_value=1000, value=1000, step=100)
+        gcw1 = sliding_gc(stats1, win=1000, step=gc_step)
+        gcw2 = sliding_gc(stats2, win=1000, step=gc_step)
         out1 = gc_outliers(gcw1)
         out2 = gc_outliers(gcw2)
         st.write(f"{id1}: {len(out1)} outlier windows")
         st.write(f"{id2}: {len(out2)} outlier windows")
 
         st.write("**Premature stop flags (rough ORF check)**")
-        st.write(f"{id1}: {premature_stop_flags(seq1)}")
-        st.write(f"{id2}: {premature_stop_flags(seq2)}")
+        st.write(f"{id1}: {premature_stop_flags(stats1)}")
+        st.write(f"{id2}: {premature_stop_flags(stats2)}")
 
         if ref_file is not None:
-            ref_id, ref_seq = read_fasta(ref_file)
-            st.write(f"**Quick SNP diff vs reference ({ref_id})** (first 5000 bases)")
-            diff1 = simple_snp_diff(seq1, ref_seq)
+            # full-overlap diff is kept with the other results until the reference changes
+            snp = analysis.get("snp")
+            if snp is None or snp["key"] != ref_file.file_id:
+                ref_id, ref_seq = load_fasta(ref_file.getvalue())
+                bar = st.progress(0.0)
+                snp = {
+                    "key": ref_file.file_id,
+                    "ref_id": ref_id,
+                    "diff1": simple_snp_diff(seq1, ref_seq, progress=lambda f: bar.progress(f / 2)),
+                    "diff2": simple_snp_diff(seq2, ref_seq, progress=lambda f: bar.progress(0.5 + f / 2))
+                }
+                bar.empty()
+                analysis["snp"] = snp
+            diff1, diff2 = snp["diff1"], snp["diff2"]
+            st.write(f"**Quick SNP diff vs reference ({snp['ref_id']})**")
             st.write(f"{id1}: SNPs={diff1['snp_count']} (checked {diff1['checked_bases']} bases)")
-            diff2 = simple_snp_diff(seq2, ref_seq)
             st.write(f"{id2}: SNPs={diff2['snp_count']} (checked {diff2['checked_bases']} bases)")
 
     # ----- PDF Report -----
     if download_report:
         report_path = "dna_report.pdf"
-        codon_plot_img = "codon_plot.png"
-        motif_plot_img = "motif_plot.png"
-        heatmap_img = "heatmap.png"
-        fig1.savefig(codon_plot_img)
-        fig2.savefig(motif_plot_img)
-        fig3.savefig(heatmap_img)
+        plot_imgs = {}
+        for key, fig in [("codon", fig1), ("motif", fig2), ("heatmap", fig3)]:
+            buf = BytesIO()
+            fig.savefig(buf, format="png", dpi=90)
+            buf.seek(0)
+            plot_imgs[key] = buf
 
         pdf = FPDF()
         pdf.add_page()
@@ -131,16 +190,20 @@ if file1 and file2:
         pdf.ln(5)
 
         # Sequence details
-        for name, length, gc_val, motif_count in [
-            (id1, len(seq1), gc1, len(motif_pos1)),
-            (id2, len(seq2), gc2, len(motif_pos2))
-        ]:
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(200, 8, f"Sequence: {name}", ln=True)
-            pdf.set_font("Arial", '', 11)
-            pdf.multi_cell(0, 6, f"Length: {length}\nGC%: {gc_val:.2f}\nMotif '{motif_input}' Count: {motif_count}")
+        details = "\n\n".join(
+            f"Sequence: {name}\nLength: {length}\nGC%: {gc_val:.2f}\nMotif '{motif_input}' Count: {motif_count}"
+            for name, length, gc_val, motif_count in [
+                (id1, len(seq1), gc1, len(motif_pos1)),
+                (id2, len(seq2), gc2, len(motif_pos2))
+            ]
+        )
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(200, 8, "Sequence Details", ln=True)
+        pdf.set_font("Arial", '', 11)
+        pdf.multi_cell(0, 6, details)
 
         # Comparison
+        pdf.ln(2)
         pdf.set_font("Arial", 'B', 12)
         pdf.cell(200, 8, "Comparison", ln=True)
         pdf.set_font("Arial", '', 11)
@@ -149,24 +212,17 @@ if file1 and file2:
                              f"Similarity (first 2000 bases): {similarity:.2f}%")
 
         # Graphs
-        pdf.ln(5)
         pdf.set_font("Arial", 'B', 12)
-        pdf.cell(200, 8, "Codon Usage Comparison", ln=True)
-        pdf.image(codon_plot_img, x=10, w=180)
-
-        pdf.ln(5)
-        pdf.cell(200, 8, f"Motif Positions for '{motif_input}'", ln=True)
-        pdf.image(motif_plot_img, x=10, w=180)
-
-        pdf.ln(5)
-        pdf.cell(200, 8, "Comparison Heatmap", ln=True)
-        pdf.image(heatmap_img, x=10, w=180)
+        for title, key in [
+            ("Codon Usage Comparison", "codon"),
+            (f"Motif Positions for '{motif_input}'", "motif"),
+            ("Comparison Heatmap", "heatmap")
+        ]:
+            pdf.ln(5)
+            pdf.cell(200, 8, title, ln=True)
+            pdf.image(plot_imgs[key], x=10, w=180)
 
         pdf.output(report_path)
 
-        os.remove(codon_plot_img)
-        os.remove(motif_plot_img)
-        os.remove(heatmap_img)
-
         with open(report_path, "rb") as f:
             st.download_button("⬇️ Download Detailed Report", f, file_name="dna_report.pdf", mime="application/pdf")
@@ -1,100 +1,222 @@
-import re
-from io import StringIO
-from collections import Counter
-from statistics import mean, pstdev
-from Bio import SeqIO
-from Bio.Seq import Seq
+from io import BytesIO
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
 from Bio.Align import PairwiseAligner
 
-IUPAC_VALID = set(list("ACGTNRYWSKMBDHV"))
+try:
+    import parasail
+except ImportError:
+    parasail = None
+
+# match=1, mismatch=0, gap open/extend=-1: Bio.Align.PairwiseAligner defaults.
+# Cover all printable ASCII so gaps/unknown symbols score like identical letters do.
+_PARASAIL_MATRIX = parasail.matrix_create("".join(map(chr, range(33, 127))), 1, 0) if parasail else None
+
+_ALIGNER = PairwiseAligner()
+_ALIGNER.mode = 'global'
+
+G, C, N = ord("G"), ord("C"), ord("N")
+
+BASES = "ACGT"
+BASE_CODES = np.frombuffer(BASES.encode("ascii"), dtype=np.uint8)
+BASE_LUT = np.full(256, 255, dtype=np.uint8)
+BASE_LUT[BASE_CODES] = np.arange(4)
+IDX_TO_CODON = [a+b+c for a in BASES for b in BASES for c in BASES]
+STOP_LUT = np.zeros(65, dtype=bool)
+STOP_LUT[[IDX_TO_CODON.index(c) for c in ("TAA", "TAG", "TGA")]] = True
+# stops among codons outside the ACGT table: RNA (U read as T, as Bio.Seq does)
+# and ambiguity codons whose every expansion is a stop, which Bio.Seq translates to '*'
+SENTINEL_STOPS = {b"TAA", b"TAG", b"TGA", b"TAR", b"TRA"}
+
+@lru_cache(maxsize=8)
+def _str_to_u8(seq):
+    return np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+
+def _as_u8(seq):
+    if isinstance(seq, SeqStats):
+        return seq.u8
+    if isinstance(seq, np.ndarray):
+        return seq
+    if isinstance(seq, (bytes, bytearray, memoryview)):
+        return np.frombuffer(seq, dtype=np.uint8)
+    return _str_to_u8(seq)
 
 def read_fasta(file):
     if hasattr(file, "getvalue"):
-        text_stream = StringIO(file.getvalue().decode("utf-8"))
+        stream = BytesIO(file.getvalue())
     else:
-        text_stream = open(file, "r")
-    record = next(SeqIO.parse(text_stream, "fasta"))
-    return record.id, str(record.seq).upper()
+        stream = open(file, "rb")
+    record_id, buf = None, bytearray()
+    with stream:
+        for line in stream:
+            if line.startswith(b">"):
+                if record_id is not None:
+                    break
+                title = line[1:].split(None, 1)
+                record_id = title[0].decode() if title else ""
+            elif record_id is not None:
+                buf += b"".join(line.split())
+    if record_id is None:
+        raise ValueError("No FASTA record found")
+    seq = np.frombuffer(buf, dtype=np.uint8)
+    # uppercase in place: clear the 0x20 bit of a-z only
+    np.bitwise_and(seq, 0xDF, out=seq, where=(seq >= ord("a")) & (seq <= ord("z")))
+    return record_id, seq
+
+@dataclass
+class SeqStats:
+    u8: np.ndarray
+    gc_cumsum: np.ndarray  # gc_cumsum[i] = G/C count in u8[:i]
+    codon_idx: list  # codon index array for reading frames 0, 1, 2
+    acgt_mask: np.ndarray
+
+    def __len__(self):
+        return self.u8.size
+
+def _codon_index(codes, frame=0):
+    # base-4 codon index per codon in the frame; 64 marks a codon with a non-ACGT base
+    c = codes[frame:]
+    c = c[:c.size // 3 * 3].reshape(-1, 3)
+    idx = (c[:, 0] << 4) | (c[:, 1] << 2) | c[:, 2]
+    idx[(c > 3).any(axis=1)] = 64
+    return idx
+
+def analyze(seq):
+    if isinstance(seq, SeqStats):
+        return seq
+    a = _as_u8(seq)
+    codes = BASE_LUT[a]
+    gc_cumsum = np.zeros(a.size + 1, dtype=np.uint32)
+    np.cumsum((a == G) | (a == C), dtype=np.uint32, out=gc_cumsum[1:])
+    return SeqStats(
+        u8=a,
+        gc_cumsum=gc_cumsum,
+        codon_idx=[_codon_index(codes, frame) for frame in range(3)],
+        acgt_mask=codes < 4
+    )
 
 def gc_content(seq):
-    return (seq.count("G") + seq.count("C")) / len(seq) * 100
+    stats = analyze(seq)
+    return float(stats.gc_cumsum[-1]) / len(stats) * 100
 
 def codon_frequency(seq):
-    counts = Counter()
-    for i in range(0, len(seq)-2, 3):
-        codon = seq[i:i+3]
-        if re.fullmatch(r"[ACGT]{3}", codon):
-            counts[codon] += 1
-    total = sum(counts.values())
-    return {cod: counts[cod] / total for cod in counts}
+    counts = np.bincount(analyze(seq).codon_idx[0], minlength=65)[:64]
+    total = counts.sum()
+    return {IDX_TO_CODON[i]: counts[i] / total for i in np.flatnonzero(counts)}
 
 def motif_search(seq, motif="ATG"):
-    return [m.start()+1 for m in re.finditer(f"(?={motif})", seq)]
+    seq = _as_u8(seq).tobytes()
+    motif = motif.encode()
+    positions = []
+    i = seq.find(motif)
+    while i != -1:
+        positions.append(i+1)
+        i = seq.find(motif, i+1)
+    return positions
 
 def compare_sequences(seq1, seq2, max_len=2000):
-    seq1 = seq1[:max_len]
-    seq2 = seq2[:max_len]
-    aligner = PairwiseAligner()
-    aligner.mode = 'global'
-    score = aligner.score(seq1, seq2)
-    similarity = (score / max(len(seq1), len(seq2))) * 100
+    # slices of the uint8 views are zero-copy; only the capped prefix becomes bytes.
+    # Uppercase so both backends score alike (parasail matches letters case-insensitively).
+    a = _as_u8(seq1)[:max_len].tobytes().upper()
+    b = _as_u8(seq2)[:max_len].tobytes().upper()
+    if parasail is not None:
+        score = parasail.nw_scan_sat(a, b, 1, 1, _PARASAIL_MATRIX).score
+    else:
+        score = _ALIGNER.score(a.decode("latin-1"), b.decode("latin-1"))
+    similarity = (score / max(len(a), len(b))) * 100
     return similarity
 
 def find_ambiguous_bases(seq):
-    bad_positions = [i+1 for i, b in enumerate(seq) if b not in "ACGT"]
+    stats = analyze(seq)
+    a = stats.u8
+    bad_positions = np.flatnonzero(~stats.acgt_mask) + 1
     n_runs = []
-    for m in re.finditer(r"N{5,}", seq):
-        n_runs.append({"start": m.start()+1, "end": m.end(), "length": m.end()-m.start()})
-    counts = {c: seq.count(c) for c in set(seq) if c not in "ACGT"}
+    n_idx = np.flatnonzero(a == N)
+    if n_idx.size:
+        breaks = np.flatnonzero(np.diff(n_idx) != 1)
+        run_starts = n_idx[np.r_[0, breaks + 1]]
+        run_ends = n_idx[np.r_[breaks, n_idx.size - 1]] + 1
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            if end - start >= 5:
+                n_runs.append({"start": start+1, "end": end, "length": end-start})
+    byte_counts = np.bincount(a, minlength=256)
+    byte_counts[BASE_CODES] = 0
+    counts = {chr(c): int(byte_counts[c]) for c in np.flatnonzero(byte_counts)}
     return {
-        "ambiguous_positions": bad_positions[:1000],
-        "ambiguous_total": len(bad_positions),
+        "ambiguous_positions": bad_positions[:1000].tolist(),
+        "ambiguous_total": int(bad_positions.size),
         "iupac_counts": counts,
         "n_runs": n_runs
     }
 
-def sliding_gc(seq, win=500):
-    vals = []
-    for i in range(0, len(seq), win):
-        chunk = seq[i:i+win]
-        if not chunk:
-            break
-        gc = (chunk.count("G")+chunk.count("C"))/len(chunk)*100
-        vals.append({"start": i+1, "end": i+len(chunk), "gc": gc})
-    return vals
+def sliding_gc(seq, win=500, step=None):
+    stats = analyze(seq)
+    starts = np.arange(0, len(stats), step or win)
+    ends = np.minimum(starts + win, len(stats))
+    # keep a short tail window only if no earlier window already reaches the end
+    keep = np.ones(starts.size, dtype=bool)
+    keep[1:] = ends[:-1] < len(stats)
+    starts, ends = starts[keep], ends[keep]
+    gc = (stats.gc_cumsum[ends] - stats.gc_cumsum[starts]) * 100.0 / (ends - starts)
+    return np.rec.fromarrays([starts + 1, ends, gc], names="start,end,gc")
 
 def gc_outliers(gc_windows, z=2.5):
-    arr = [w["gc"] for w in gc_windows]
-    if len(arr) < 3:
+    if len(gc_windows) < 3:
         return []
-    mu, sd = mean(arr), pstdev(arr) or 1e-9
+    arr = np.asarray(gc_windows["gc"], dtype=float)
+    mu, sd = arr.mean(), arr.std() or 1e-9
+    zsc = (arr - mu) / sd
+    idx = np.flatnonzero(np.abs(zsc) >= z)
     out = []
-    for w in gc_windows:
-        zsc = (w["gc"]-mu)/sd
-        if abs(zsc) >= z:
-            w2 = w.copy()
-            w2["z"] = zsc
-            out.append(w2)
+    for i in idx:
+        w2 = {k: gc_windows[k][i].item() for k in gc_windows.dtype.names}
+        w2["z"] = zsc[i].item()
+        out.append(w2)
     return out
 
 def premature_stop_flags(seq, min_orf=150):
     flags = []
+    stats = analyze(seq)
+    # only a stop within the first min_orf nt can be flagged; don't scan past it
+    n_codons = max(-(-min_orf // 3), 0)
     for frame in [0,1,2]:
-        prot = Seq(seq[frame:]).translate(to_stop=False)
-        stops = [i for i,aa in enumerate(prot) if aa=="*"]
-        if stops and stops[0]*3 < min_orf:
-            flags.append({"frame": frame, "first_stop_nt": stops[0]*3+frame+1})
+        idx = stats.codon_idx[frame][:n_codons]
+        stops = STOP_LUT[idx]
+        for i in np.flatnonzero(idx == 64).tolist():
+            stops[i] = stats.u8[frame+3*i:frame+3*i+3].tobytes().replace(b"U", b"T") in SENTINEL_STOPS
+        if stops.any():
+            first = int(stops.argmax())
+            if first*3 < min_orf:
+                flags.append({"frame": frame, "first_stop_nt": first*3+frame+1})
     return flags
 
-def simple_snp_diff(seq, ref, max_len=5000):
-    L = min(len(seq), len(ref), max_len)
-    snps = []
-    for i in range(L):
-        a, b = seq[i], ref[i]
-        if a in IUPAC_VALID and b in IUPAC_VALID and a!=b and a in "ACGT" and b in "ACGT":
-            snps.append({"pos": i+1, "ref": b, "alt": a})
+def iter_snp_diff(seq, ref, max_len=None, chunk=1_000_000):
+    a, b = _as_u8(seq), _as_u8(ref)
+    L = min(a.size, b.size) if max_len is None else min(a.size, b.size, max_len)
+    for off in range(0, L, chunk):
+        end = min(off + chunk, L)
+        ca, cb = a[off:end], b[off:end]
+        diff = (ca != cb) & (BASE_LUT[ca] < 4) & (BASE_LUT[cb] < 4)
+        yield {
+            "checked_bases": end,
+            "total_bases": L,
+            "snp_positions": np.flatnonzero(diff) + off + 1
+        }
+
+def simple_snp_diff(seq, ref, max_len=None, chunk=1_000_000, progress=None):
+    # progress, if given, is called with the fraction of bases checked after each chunk
+    a, b = _as_u8(seq), _as_u8(ref)
+    checked, snp_count, snps = 0, 0, []
+    for part in iter_snp_diff(a, b, max_len, chunk):
+        checked = part["checked_bases"]
+        if progress is not None:
+            progress(checked / part["total_bases"])
+        snp_count += part["snp_positions"].size
+        for pos in part["snp_positions"][:1000-len(snps)].tolist():
+            snps.append({"pos": pos, "ref": chr(b[pos-1]), "alt": chr(a[pos-1])})
     return {
-        "checked_bases": L,
-        "snp_count": len(snps),
-        "snps_preview": snps[:1000]
+        "checked_bases": checked,
+        "snp_count": snp_count,
+        "snps_preview": snps
     }